@@ -8,8 +8,16 @@ import pandas as pd
 from datetime import datetime, date, timedelta
 import database as db
 import io
-import plotly.express as px
+import html
+import plotly.graph_objects as go
 import os
+import re
+import codecs
+
+try:
+    from charset_normalizer import from_bytes as _detect_charset
+except Exception:  # 未導入でも BOM / UTF-8 / CP932 の判定は行える
+    _detect_charset = None
 
 # ============================================================
 # アプリケーション設定
@@ -38,7 +46,7 @@ SIMPLE_ONLY_MODE = _is_simple_only_mode()
 # ============================================================
 # カスタムCSS
 # ============================================================
-st.markdown("""
+_CUSTOM_CSS = """
 <style>
     /* メトリクスカード */
     div[data-testid="stMetric"] {
@@ -98,7 +106,10 @@ st.markdown("""
     .cycle-card h4 { margin: 0 0 8px 0; color: #2e7d32; }
     .cycle-meta { font-size: 0.85em; color: #777; }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# 要素は毎回の再実行で出力しないと画面から消えるため、セッション単位では省略しない
+st.markdown(_CUSTOM_CSS, unsafe_allow_html=True)
 
 if SIMPLE_ONLY_MODE:
     # 閲覧専用リンクではサイドバー・展開ボタンを非表示
@@ -147,18 +158,61 @@ WORK_TYPES = [
 STATUS_OPTIONS = ["育苗中", "まもなく収穫開始", "収穫中", "まもなく収穫終了", "終了", "計画中"]
 ACTIVE_STATUS_OPTIONS = ["育苗中", "まもなく収穫開始", "収穫中", "まもなく収穫終了"]
 QUALITY_OPTIONS = ["", "A", "B", "C"]
+_STATUS_INDEX = {v: i for i, v in enumerate(STATUS_OPTIONS)}
+_QUALITY_INDEX = {v: i for i, v in enumerate(QUALITY_OPTIONS)}
+
+# CSVの文字コード候補（判定結果で読めない場合はこの順に試す）
+CSV_ENCODINGS = ["cp932", "shift_jis", "utf-8", "utf-8-sig", "utf-16", "latin1"]
+ENCODING_AUTO = "自動判定"
+
+# CSVのプレビュー行数と、インポート・文字コード確認で一度に扱う量
+CSV_PREVIEW_ROWS = 20
+CSV_CHUNK_ROWS = 10_000
+CSV_CHUNK_BYTES = 1024 * 1024
+
+# CSVはすべて文字列のまま読み、空欄も NaN にせず空文字で受け取る
+_CSV_READ_OPTIONS = {"dtype": str, "keep_default_na": False, "na_filter": False}
+
+# CSVの日付表記（YY/MM/DD・YYYY-MM-DD・YYYYMMDD）
+_CSV_DATE_RE = re.compile(
+    r"^(?:(\d{1,4})\s*/\s*(\d{1,2})\s*/\s*(\d{1,2})|(\d{4}-\d{2}-\d{2})|(\d{8}))$",
+    re.ASCII,
+)
+
+# 作付け一覧・未紐づけ作業記録で1回に描画する件数
+CYCLES_PAGE_SIZE = 25
+UNLINKED_PAGE_SIZE = 50
+
+# 作業記録一覧の表示列と見出し
+_LOG_COLUMNS = ("id", "work_date", "work_type", "cell_pot", "quantity",
+                "crop_name", "field_id", "content", "note")
+_CYCLE_LOG_COLUMNS = ("work_date", "work_type", "cell_pot", "quantity",
+                      "content", "note")
+# 値の種類が少なく category 型で持つ列
+_LOG_CATEGORY_COLUMNS = ("work_type", "field_id", "crop_name")
+_LOG_COL_RENAME = {
+    "id": "ID", "work_date": "日付", "work_type": "作業",
+    "cell_pot": "セル・ポット", "quantity": "数量",
+    "crop_name": "作付け", "field_id": "圃場",
+    "content": "内容", "note": "備考",
+}
 
 # ============================================================
 # 初期化
 # ============================================================
-db.init_db()
+@st.cache_resource
+def _bootstrap_db():
+    """テーブル作成・移行はサーバープロセスにつき1回だけ行う"""
+    db.init_db()
+    return True
+
+
+_bootstrap_db()
 
 if "admin_mode" not in st.session_state:
     st.session_state.admin_mode = False
 if "selected_cycle" not in st.session_state:
     st.session_state.selected_cycle = None
-if "page" not in st.session_state:
-    st.session_state.page = "📊 ダッシュボード"
 
 
 # ============================================================
@@ -177,20 +231,112 @@ def status_badge(status):
     return f'<span class="badge {cls.get(status, "")}">{status}</span>'
 
 
+_DATE_FORMAT = "%Y-%m-%d"
+_strptime = datetime.strptime
+
+
 def safe_date(d):
     """日付文字列をdate型に変換（変換不可ならNone）"""
     if not d:
         return None
     try:
-        return datetime.strptime(d, "%Y-%m-%d").date()
+        return _strptime(d, _DATE_FORMAT).date()
     except (ValueError, TypeError):
         return None
 
 
+def to_date_series(series):
+    """日付文字列の列をまとめてdate型に変換（変換不可はNaT）"""
+    return pd.to_datetime(series, format=_DATE_FORMAT, errors="coerce").dt.date
+
+
 def navigate_to_timeline(cycle_id):
     """タイムラインページへ遷移"""
     st.session_state.selected_cycle = cycle_id
-    st.session_state.page = "📅 タイムライン"
+    st.switch_page(PAGE_TIMELINE)
+
+
+# ============================================================
+# キャッシュ付きデータ取得
+# ============================================================
+@st.cache_data(ttl=300)
+def _cached_dashboard_stats(cycles_version, logs_version):
+    """ダッシュボード用の統計情報（どちらかの版が変わるまでDBへ問い合わせない）"""
+    return db.get_dashboard_stats()
+
+
+@st.cache_data(ttl=300)
+def _cached_active_cycles(cycles_version):
+    """進行中の作付け一覧"""
+    return [
+        cy for cy in db.get_all_crop_cycles()
+        if cy.get("status") in ACTIVE_STATUS_OPTIONS
+    ]
+
+
+@st.cache_data(ttl=300)
+def _cached_recent_work_logs(cycles_version, logs_version, limit):
+    """最近の作業記録（作付け名を結合するため両方の版で作り直す）"""
+    return db.get_recent_work_logs(limit=limit)
+
+
+@st.cache_data(ttl=300)
+def _cached_log_counts_by_cycle(logs_version):
+    """作付けごとの作業件数 {cycle_id: 件数}"""
+    return db.get_log_counts_by_cycle()
+
+
+@st.cache_data(ttl=300)
+def _cached_work_log_counts(logs_version, cycle_ids):
+    """作付けごとの作業件数と最新の作業種別 {cycle_id: (件数, 最新作業)}"""
+    summaries = db.get_cycle_log_summaries(cycle_ids)
+    counts = {}
+    for cycle_id in cycle_ids:
+        summary = summaries.get(cycle_id)
+        if summary:
+            counts[cycle_id] = (summary["log_count"], summary["last_work_type"])
+        else:
+            counts[cycle_id] = (0, "―")
+    return counts
+
+
+@st.cache_data(ttl=300)
+def _cached_unlinked_count(logs_version):
+    """作付けに紐づいていない作業記録の件数"""
+    return db.count_work_logs(unlinked=True)
+
+
+@st.cache_data(ttl=300)
+def _cycle_labels(version, include_none=False, missing_field="―",
+                  show_status=True):
+    """作付け選択肢のラベル {id: ラベル}（version が変わると作り直す）"""
+    labels = {0: "（紐づけなし）"} if include_none else {}
+    for cy in db.get_all_crop_cycles():
+        label = (
+            f"{cy['crop_name']}"
+            f"{'（' + cy['variety'] + '）' if cy.get('variety') else ''}"
+            f" [{cy.get('field_id') or missing_field}]"
+        )
+        if show_status:
+            label += f" - {cy['status']}"
+        labels[cy["id"]] = label
+    return labels
+
+
+@st.cache_data(ttl=300)
+def _distinct_sets(cycles_version, logs_version):
+    """圃場ID・作物名・作業種別の一覧（作付け・作業記録どちらの更新でも作り直す）"""
+    return db.get_distinct_sets()
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _filtered_work_logs(cycles_version, logs_version, date_from, date_to,
+                        work_type, field_id):
+    """作業記録一覧の検索結果（作付け名を結合するため両方の版で作り直す）"""
+    return db.get_all_work_logs(
+        date_from=date_from, date_to=date_to,
+        work_type=work_type, field_id=field_id, as_dataframe=True,
+    )
 
 
 # ============================================================
@@ -199,7 +345,9 @@ def navigate_to_timeline(cycle_id):
 def page_dashboard():
     st.header("📊 ダッシュボード")
 
-    stats = db.get_dashboard_stats()
+    cycles_version = db.get_cycles_version()
+    logs_version = db.get_work_logs_version()
+    stats = _cached_dashboard_stats(cycles_version, logs_version)
 
     # メトリクスカード
     c1, c2, c3, c4 = st.columns(4)
@@ -215,42 +363,47 @@ def page_dashboard():
     # 進行中の作付け
     with col_left:
         st.subheader("🌱 進行中の作付け")
-        active = [
-            cy for cy in db.get_all_crop_cycles()
-            if cy.get("status") in ACTIVE_STATUS_OPTIONS
-        ]
+        active = _cached_active_cycles(cycles_version)
         if active:
-            for cy in active[:10]:
-                logs = db.get_work_logs_by_cycle(cy["id"])
-                last_work = logs[-1]["work_type"] if logs else "―"
+            shown = active[:10]
+            log_counts = _cached_work_log_counts(
+                logs_version, tuple(cy["id"] for cy in shown)
+            )
+            cards = []
+            for cy in shown:
+                log_count, last_work = log_counts[cy["id"]]
                 field_text = f"📍 {cy['field_id']}" if cy["field_id"] else ""
                 variety_text = f"（{cy['variety']}）" if cy["variety"] else ""
-                st.markdown(f"""
+                cards.append(f"""
                 <div class="cycle-card">
                     <h4>🌱 {cy['crop_name']}{variety_text}</h4>
                     <div class="cycle-meta">
                         {field_text}　開始: {cy['start_date'] or '未設定'}　
-                        作業数: {len(logs)}件　最新: {last_work}
+                        作業数: {log_count}件　最新: {last_work}
                     </div>
                 </div>
-                """, unsafe_allow_html=True)
+                """)
+            # カードはまとめて1回で描画する
+            st.markdown("".join(cards), unsafe_allow_html=True)
         else:
             st.info("進行中の作付けはありません")
 
     # 最近の作業
     with col_right:
         st.subheader("📝 最近の作業")
-        recent = db.get_recent_work_logs(limit=10)
+        recent = _cached_recent_work_logs(cycles_version, logs_version, 10)
         if recent:
+            entries = []
             for log in recent:
                 crop_info = ""
                 if log.get("crop_name"):
                     crop_info = f" → {log['crop_name']}"
-                st.markdown(
+                entries.append(
                     f"**{log['work_date']}**　"
                     f"`{log['work_type']}`{crop_info}  \n"
-                    f"{log.get('content') or ''}",
+                    f"{log.get('content') or ''}"
                 )
+            st.markdown("\n\n".join(entries))
         else:
             st.info("作業記録がありません")
 
@@ -268,7 +421,9 @@ def page_crop_cycles():
     with fc2:
         crop_f = st.text_input("作物名で検索", "")
     with fc3:
-        fields = ["すべて"] + db.get_distinct_fields()
+        fields = ["すべて"] + _distinct_sets(
+            db.get_cycles_version(), db.get_work_logs_version()
+        )["field"]
         field_f = st.selectbox("圃場", fields)
 
     cycles = db.get_all_crop_cycles(
@@ -279,9 +434,18 @@ def page_crop_cycles():
         st.info("該当する作付けがありません")
         return
 
-    st.caption(f"{len(cycles)} 件の作付け")
+    # 表示範囲（フィルターで件数が減った場合は末尾ページに寄せる）
+    total = len(cycles)
+    last_offset = (total - 1) // CYCLES_PAGE_SIZE * CYCLES_PAGE_SIZE
+    offset = min(st.session_state.get("cy_offset", 0), last_offset)
+    st.session_state.cy_offset = offset
+    end = min(offset + CYCLES_PAGE_SIZE, total)
 
-    for cy in cycles:
+    st.caption(f"{total} 件の作付け（{offset + 1}～{end} 件目を表示）")
+
+    log_counts = _cached_log_counts_by_cycle(db.get_work_logs_version())
+
+    for cy in cycles[offset:end]:
         variety_text = f"（{cy['variety']}）" if cy.get("variety") else ""
         title = f"{cy['crop_name']}{variety_text}"
         field_info = f"📍 {cy['field_id']}" if cy.get("field_id") else ""
@@ -304,23 +468,34 @@ def page_crop_cycles():
             if cy.get("comment"):
                 st.write(f"**コメント:** {cy['comment']}")
 
-            # 紐づく作業記録
-            logs = db.get_work_logs_by_cycle(cy["id"])
-            if logs:
-                st.write(f"**作業記録:** {len(logs)} 件")
-                log_df = pd.DataFrame(logs)
-                log_display = ["work_date", "work_type", "cell_pot", "quantity", "content", "note"]
-                log_existing = [c for c in log_display if c in log_df.columns]
-                log_df = log_df[log_existing]
-                log_rename = {"work_date": "日付", "work_type": "作業",
-                              "cell_pot": "セル・ポット", "quantity": "数量",
-                              "content": "内容", "note": "備考"}
-                log_df.rename(columns=log_rename, inplace=True)
+            # 紐づく作業記録（表示を選んだ作付けだけ取得する）
+            log_count = log_counts.get(cy["id"], 0)
+            if log_count:
+                st.write(f"**作業記録:** {log_count} 件")
+            if log_count and st.toggle("📋 作業記録を表示", key=f"open_{cy['id']}"):
+                logs = db.get_work_logs_by_cycle(cy["id"])
+                log_df = pd.DataFrame.from_records(logs, columns=_CYCLE_LOG_COLUMNS)
+                log_df.columns = [_LOG_COL_RENAME[c] for c in _CYCLE_LOG_COLUMNS]
                 st.dataframe(log_df, use_container_width=True, hide_index=True)
 
             if st.button("📅 タイムラインを見る", key=f"tl_{cy['id']}"):
                 navigate_to_timeline(cy["id"])
-                st.rerun()
+
+    if total > CYCLES_PAGE_SIZE:
+        pc1, pc2 = st.columns(2)
+        pc1.button(
+            "◀ 前へ", key="cy_prev", disabled=offset == 0,
+            on_click=_set_page_offset, args=("cy_offset", offset - CYCLES_PAGE_SIZE),
+        )
+        pc2.button(
+            "次へ ▶", key="cy_next", disabled=end >= total,
+            on_click=_set_page_offset, args=("cy_offset", offset + CYCLES_PAGE_SIZE),
+        )
+
+
+def _set_page_offset(key, offset):
+    """ページ送りの表示開始位置を変更"""
+    st.session_state[key] = max(0, offset)
 
 
 # ============================================================
@@ -357,31 +532,22 @@ def page_crop_cycles_simple():
 def page_timeline():
     st.header("📅 タイムライン")
 
-    cycles = db.get_all_crop_cycles()
-    if not cycles:
+    # 作付け選択
+    cycle_options = _cycle_labels(db.get_cycles_version(), missing_field="圃場未設定")
+    if not cycle_options:
         st.info("作付けが登録されていません。先に作付けを登録してください。")
         return
 
-    # 作付け選択
-    cycle_options = {
-        cy["id"]: f"{cy['crop_name']}"
-                   f"{'（' + cy['variety'] + '）' if cy.get('variety') else ''}"
-                   f" [{cy.get('field_id') or '圃場未設定'}]"
-                   f" - {cy['status']}"
-        for cy in cycles
-    }
-
     # プリセレクト
+    ids = tuple(cycle_options)
     default_idx = 0
-    if st.session_state.selected_cycle:
-        ids = list(cycle_options.keys())
-        if st.session_state.selected_cycle in ids:
-            default_idx = ids.index(st.session_state.selected_cycle)
+    if st.session_state.selected_cycle in cycle_options:
+        default_idx = ids.index(st.session_state.selected_cycle)
 
     selected_id = st.selectbox(
         "作付けを選択",
-        options=list(cycle_options.keys()),
-        format_func=lambda x: cycle_options[x],
+        options=ids,
+        format_func=cycle_options.__getitem__,
         index=default_idx,
     )
 
@@ -431,17 +597,17 @@ def page_timeline():
 
     st.caption(f"📋 作業記録: {len(logs)} 件")
 
-    # タイムラインHTML生成
-    html = '<div class="tl-container">'
+    # タイムラインHTML生成（入力値はエスケープして埋め込む）
+    parts = ['<div class="tl-container">']
     for log in logs:
         note_html = (
-            f'<div class="tl-note">📌 {log["note"]}</div>'
+            f'<div class="tl-note">📌 {html.escape(log["note"])}</div>'
             if log.get("note")
             else ""
         )
-        content_text = log.get("content") or ""
-        cell_pot_text = log.get("cell_pot") or ""
-        quantity_text = log.get("quantity") or ""
+        content_text = html.escape(log.get("content") or "")
+        cell_pot_text = html.escape(log.get("cell_pot") or "")
+        quantity_text = html.escape(log.get("quantity") or "")
         detail_parts = []
         if cell_pot_text:
             detail_parts.append(f"📦 {cell_pot_text}")
@@ -451,70 +617,110 @@ def page_timeline():
             f'<div class="tl-note">{" ／ ".join(detail_parts)}</div>'
             if detail_parts else ""
         )
-        html += f"""
+        parts.append(f"""
         <div class="tl-item">
-            <div class="tl-date">{log['work_date']}</div>
-            <span class="tl-type">{log['work_type']}</span>
+            <div class="tl-date">{html.escape(log['work_date'] or '')}</div>
+            <span class="tl-type">{html.escape(log['work_type'] or '')}</span>
             {detail_html}
             <div class="tl-content">{content_text}</div>
             {note_html}
         </div>
-        """
-    html += "</div>"
-    st.markdown(html, unsafe_allow_html=True)
+        """)
+    parts.append("</div>")
+    st.markdown("".join(parts), unsafe_allow_html=True)
 
 
 # ============================================================
 # ページ: 集計・分析
 # ============================================================
+def _gl_line(x, y, **kwargs):
+    """折れ線トレース（点数が多い時系列でも軽いWebGL描画を使う）"""
+    return go.Scattergl(x=x, y=y, mode="lines", **kwargs)
+
+
+@st.cache_data(ttl=300)
+def _monthly_fig(version):
+    """月別作業件数のグラフ（作業記録の更新世代ごとにキャッシュ）"""
+    monthly = db.get_monthly_work_counts()
+    if not monthly:
+        return None
+    return go.Figure(
+        data=[go.Bar(
+            x=[r["month"] for r in monthly],
+            y=[r["count"] for r in monthly],
+            marker_color="#4CAF50",
+            hovertemplate="月: %{x}<br>件数: %{y}<extra></extra>",
+        )],
+        layout=go.Layout(
+            title="月別作業件数", xaxis_title="月", yaxis_title="件数",
+            xaxis_tickangle=-45,
+        ),
+    )
+
+
+@st.cache_data(ttl=300)
+def _yield_fig(version):
+    """作物別収量のグラフと一覧表（作付けの更新世代ごとにキャッシュ）"""
+    df = db.get_yield_summary(as_dataframe=True)
+    if df.empty:
+        return None, None
+    fig = go.Figure(
+        data=[go.Bar(
+            x=df["crop_name"].tolist(),
+            y=df["total_yield"].tolist(),
+            marker_color="#FF8F00",
+            hovertemplate="作物: %{x}<br>総収量: %{y}<extra></extra>",
+        )],
+        layout=go.Layout(
+            title="作物別 総収量", xaxis_title="作物", yaxis_title="総収量",
+        ),
+    )
+    display_df = df[["crop_name", "total_yield", "yield_unit",
+                     "avg_yield", "count"]].copy()
+    display_df.columns = ["作物", "総収量", "単位", "平均収量", "作付け数"]
+    return fig, display_df
+
+
+@st.cache_data(ttl=300)
+def _work_type_fig(version):
+    """作業種別の割合グラフ（作業記録の更新世代ごとにキャッシュ）"""
+    wt_counts = db.get_work_type_counts()
+    if not wt_counts:
+        return None
+    return go.Figure(
+        data=[go.Pie(
+            labels=[r["work_type"] for r in wt_counts],
+            values=[r["count"] for r in wt_counts],
+        )],
+        layout=go.Layout(title="作業種別の割合"),
+    )
+
+
 def page_analytics():
     st.header("📈 集計・分析")
 
     tab1, tab2, tab3 = st.tabs(["📊 月別作業件数", "🌾 収量集計", "🔧 作業種別"])
 
     with tab1:
-        monthly = db.get_monthly_work_counts()
-        if monthly:
-            df = pd.DataFrame(monthly)
-            fig = px.bar(
-                df, x="month", y="count",
-                labels={"month": "月", "count": "件数"},
-                title="月別作業件数",
-                color_discrete_sequence=["#4CAF50"],
-            )
-            fig.update_layout(xaxis_tickangle=-45)
+        fig = _monthly_fig(db.get_work_logs_version())
+        if fig is not None:
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("データがありません")
 
     with tab2:
-        yields = db.get_yield_summary()
-        if yields:
-            df = pd.DataFrame(yields)
-            fig = px.bar(
-                df, x="crop_name", y="total_yield",
-                labels={"crop_name": "作物", "total_yield": "総収量"},
-                title="作物別 総収量",
-                color_discrete_sequence=["#FF8F00"],
-            )
+        fig, display_df = _yield_fig(db.get_cycles_version())
+        if fig is not None:
             st.plotly_chart(fig, use_container_width=True)
 
             st.subheader("収量一覧")
-            display_df = df[["crop_name", "total_yield", "yield_unit",
-                             "avg_yield", "count"]].copy()
-            display_df.columns = ["作物", "総収量", "単位", "平均収量", "作付け数"]
             st.dataframe(display_df, use_container_width=True, hide_index=True)
         else:
             st.info("収量データがありません")
 
     with tab3:
-        wt_counts = db.get_work_type_counts()
-        if wt_counts:
-            df = pd.DataFrame(wt_counts)
-            fig = px.pie(
-                df, values="count", names="work_type",
-                title="作業種別の割合",
-            )
+        fig = _work_type_fig(db.get_work_logs_version())
+        if fig is not None:
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("データがありません")
@@ -531,15 +737,7 @@ def page_work_log_input():
         return
 
     # 作付け選択肢
-    cycles = db.get_all_crop_cycles()
-    cycle_options = {0: "（紐づけなし）"}
-    for cy in cycles:
-        label = (
-            f"{cy['crop_name']}"
-            f"{'（' + cy['variety'] + '）' if cy.get('variety') else ''}"
-            f" [{cy.get('field_id') or '―'}] - {cy['status']}"
-        )
-        cycle_options[cy["id"]] = label
+    cycle_options = _cycle_labels(db.get_cycles_version(), include_none=True)
 
     with st.form("work_log_form", clear_on_submit=True):
         st.subheader("新しい作業記録")
@@ -572,8 +770,8 @@ def page_work_log_input():
 
         cycle_id = st.selectbox(
             "紐づける作付け",
-            options=list(cycle_options.keys()),
-            format_func=lambda x: cycle_options[x],
+            options=tuple(cycle_options),
+            format_func=cycle_options.__getitem__,
         )
 
         content = st.text_area("作業内容", placeholder="具体的な作業内容を記入")
@@ -601,20 +799,9 @@ def page_work_log_input():
     # 最近の作業記録
     st.divider()
     st.subheader("最近の作業記録")
-    recent = db.get_recent_work_logs(limit=20)
-    if recent:
-        df = pd.DataFrame(recent)
-        display_cols = ["id", "work_date", "work_type", "cell_pot", "quantity",
-                        "crop_name", "field_id", "content", "note"]
-        existing_cols = [c for c in display_cols if c in df.columns]
-        display_df = df[existing_cols].copy()
-        col_rename = {
-            "id": "ID", "work_date": "日付", "work_type": "作業",
-            "cell_pot": "セル・ポット", "quantity": "数量",
-            "crop_name": "作付け", "field_id": "圃場",
-            "content": "内容", "note": "備考",
-        }
-        display_df.rename(columns=col_rename, inplace=True)
+    recent = db.get_recent_work_logs_slim(limit=20, as_dataframe=True)
+    if not recent.empty:
+        display_df = recent.rename(columns=_LOG_COL_RENAME)
         st.dataframe(display_df, use_container_width=True, hide_index=True)
 
         # 削除機能
@@ -688,22 +875,14 @@ def page_crop_cycle_form():
 
     # --- 編集・結果入力 ---
     with tab_edit:
-        cycles = db.get_all_crop_cycles()
-        if not cycles:
+        cycle_opts = _cycle_labels(db.get_cycles_version())
+        if not cycle_opts:
             st.info("作付けが登録されていません")
         else:
-            cycle_opts = {
-                cy["id"]: (
-                    f"{cy['crop_name']}"
-                    f"{'（' + cy['variety'] + '）' if cy.get('variety') else ''}"
-                    f" [{cy.get('field_id') or '―'}] - {cy['status']}"
-                )
-                for cy in cycles
-            }
             edit_id = st.selectbox(
                 "編集する作付け",
-                options=list(cycle_opts.keys()),
-                format_func=lambda x: cycle_opts[x],
+                options=tuple(cycle_opts),
+                format_func=cycle_opts.__getitem__,
                 key="edit_cycle_select",
             )
 
@@ -746,8 +925,7 @@ def page_crop_cycle_form():
 
                     e_status = st.selectbox(
                         "ステータス", STATUS_OPTIONS,
-                        index=STATUS_OPTIONS.index(cy["status"])
-                        if cy["status"] in STATUS_OPTIONS else 1,
+                        index=_STATUS_INDEX.get(cy["status"], 1),
                     )
 
                     st.divider()
@@ -764,11 +942,7 @@ def page_crop_cycle_form():
                             "単位", value=cy.get("yield_unit") or "kg",
                         )
                     with rc3:
-                        current_q = cy.get("quality_rating") or ""
-                        q_idx = (
-                            QUALITY_OPTIONS.index(current_q)
-                            if current_q in QUALITY_OPTIONS else 0
-                        )
+                        q_idx = _QUALITY_INDEX.get(cy.get("quality_rating") or "", 0)
                         e_quality = st.selectbox(
                             "品質評価", QUALITY_OPTIONS, index=q_idx,
                         )
@@ -821,41 +995,64 @@ def page_crop_cycle_form():
     with tab_link:
         st.subheader("未紐づけの作業記録を作付けにリンク")
 
-        cycles = db.get_all_crop_cycles()
-        if not cycles:
+        cycle_opts = _cycle_labels(db.get_cycles_version(), show_status=False)
+        if not cycle_opts:
             st.info("先に作付けを登録してください")
         else:
-            cycle_opts = {
-                cy["id"]: (
-                    f"{cy['crop_name']}"
-                    f"{'（' + cy['variety'] + '）' if cy.get('variety') else ''}"
-                    f" [{cy.get('field_id') or '―'}]"
-                )
-                for cy in cycles
-            }
             target_cycle = st.selectbox(
                 "紐づけ先の作付け",
-                options=list(cycle_opts.keys()),
-                format_func=lambda x: cycle_opts[x],
+                options=tuple(cycle_opts),
+                format_func=cycle_opts.__getitem__,
                 key="link_target",
             )
 
-            unlinked = db.get_unlinked_work_logs()
-            if unlinked:
-                st.write(f"未紐づけの作業記録: {len(unlinked)} 件")
-                for log in unlinked[:50]:
+            unlinked_count = _cached_unlinked_count(db.get_work_logs_version())
+            if unlinked_count:
+                last_offset = (unlinked_count - 1) // UNLINKED_PAGE_SIZE * UNLINKED_PAGE_SIZE
+                offset = min(st.session_state.get("unlinked_offset", 0), last_offset)
+                st.session_state.unlinked_offset = offset
+                unlinked = db.get_work_logs_page(offset, UNLINKED_PAGE_SIZE, unlinked=True)
+
+                st.write(
+                    f"未紐づけの作業記録: {unlinked_count} 件"
+                    f"（{offset + 1}～{offset + len(unlinked)} 件目）"
+                )
+                for log in unlinked:
                     col1, col2 = st.columns([5, 1])
                     with col1:
-                        st.write(
+                        st.checkbox(
                             f"**{log['work_date']}** `{log['work_type']}`　"
                             f"{log.get('field_id') or ''}　"
-                            f"{log.get('content') or ''}"
+                            f"{log.get('content') or ''}",
+                            key=f"link_sel_{log['id']}",
                         )
                     with col2:
                         if st.button("リンク", key=f"link_{log['id']}"):
                             db.link_work_log_to_cycle(log["id"], target_cycle)
                             st.success("紐づけました")
                             st.rerun()
+
+                selected = [log["id"] for log in unlinked
+                            if st.session_state.get(f"link_sel_{log['id']}")]
+                if st.button(f"🔗 選択した {len(selected)} 件をまとめてリンク",
+                             key="link_selected", disabled=not selected):
+                    db.bulk_link_work_logs_to_cycle(selected, target_cycle)
+                    st.success(f"{len(selected)} 件を紐づけました")
+                    st.rerun()
+
+                if unlinked_count > UNLINKED_PAGE_SIZE:
+                    pc1, pc2 = st.columns(2)
+                    pc1.button(
+                        "◀ 前へ", key="unlinked_prev", disabled=offset == 0,
+                        on_click=_set_page_offset,
+                        args=("unlinked_offset", offset - UNLINKED_PAGE_SIZE),
+                    )
+                    pc2.button(
+                        "次へ ▶", key="unlinked_next",
+                        disabled=offset + UNLINKED_PAGE_SIZE >= unlinked_count,
+                        on_click=_set_page_offset,
+                        args=("unlinked_offset", offset + UNLINKED_PAGE_SIZE),
+                    )
             else:
                 st.info("未紐づけの作業記録はありません")
 
@@ -880,27 +1077,34 @@ def page_csv_import():
         "CSVファイルを選択", type=["csv"],
         help="Shift-JIS または UTF-8 のCSVファイルに対応"
     )
+    enc_choice = st.selectbox("文字コード", [ENCODING_AUTO] + CSV_ENCODINGS)
 
     if uploaded is not None:
-        # エンコーディング自動判定
-        raw = uploaded.read()
-        uploaded.seek(0)
+        raw = uploaded.getvalue()
 
-        df = None
-        for enc in ["cp932", "shift_jis", "utf-8", "utf-8-sig", "latin1"]:
-            try:
-                df = pd.read_csv(io.BytesIO(raw), encoding=enc)
-                break
-            except (UnicodeDecodeError, Exception):
-                continue
+        # 自動判定時は推定した文字コードから試し、読めなければ残りの候補へ
+        if enc_choice == ENCODING_AUTO:
+            detected = _detect_encoding(raw)
+            encodings = [detected] + [e for e in CSV_ENCODINGS if e != detected]
+        else:
+            encodings = [enc_choice]
 
-        if df is None:
+        enc = _pick_encoding(raw, encodings)
+        if enc is None:
             st.error("CSVの読み込みに失敗しました。エンコーディングを確認してください。")
             return
 
+        # プレビューは先頭だけ読み、本体はインポート時にチャンク単位で読む
+        try:
+            df = pd.read_csv(io.BytesIO(raw), encoding=enc, nrows=CSV_PREVIEW_ROWS,
+                             **_CSV_READ_OPTIONS)
+        except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+            st.error(f"CSVの形式を読み取れませんでした: {e}")
+            return
+
         st.subheader("📋 プレビュー")
-        st.write(f"列数: {len(df.columns)}　行数: {len(df)}")
-        st.dataframe(df.head(20), use_container_width=True)
+        st.write(f"列数: {len(df.columns)}　（先頭 {len(df)} 行を表示）")
+        st.dataframe(df, use_container_width=True)
 
         # カラムマッピング
         st.subheader("🔧 列の対応づけ")
@@ -917,93 +1121,123 @@ def page_csv_import():
             col_note = st.selectbox("備考の列", cols, index=min(6, len(cols) - 1))
 
         if st.button("📥 インポート実行", use_container_width=True):
-            records = []
-            prev_date = ""
-            for _, row in df.iterrows():
-                # 日付処理
-                raw_date = ""
-                if col_date != "（なし）":
-                    raw_date = str(row.get(col_date, "")).strip()
-
-                work_date = _convert_date(raw_date, prev_date)
-                if work_date:
-                    prev_date = work_date
-
-                # 作業種別
-                work_type = ""
-                if col_type != "（なし）":
-                    work_type = str(row.get(col_type, "")).strip()
-                if not work_type or work_type == "nan":
-                    work_type = "その他"
-
-                # その他のフィールド
-                field_id = _get_val(row, col_field)
-                row_id = _get_val(row, col_row)
-                content = _get_val(row, col_content)
-                note = _get_val(row, col_note)
-
-                # 空行スキップ
-                if not work_date and not content:
-                    continue
-
-                records.append({
-                    "work_date": work_date,
-                    "work_type": work_type,
-                    "field_id": field_id,
-                    "row_id": row_id,
-                    "content": content,
-                    "note": note,
-                })
-
-            if records:
-                count = db.import_csv_records(records)
+            col_map = {
+                "work_date": col_date, "work_type": col_type,
+                "field_id": col_field, "row_id": col_row,
+                "content": col_content, "note": col_note,
+            }
+            chunks = pd.read_csv(io.BytesIO(raw), encoding=enc, chunksize=CSV_CHUNK_ROWS,
+                                 **_CSV_READ_OPTIONS)
+            # 全チャンクを1トランザクションで登録し、途中で失敗したら全件取り消す
+            try:
+                count = db.import_work_log_rows(_iter_import_rows(chunks, col_map))
+            except pd.errors.ParserError as e:
+                st.error(f"CSVの形式を読み取れませんでした（インポートは取り消しました）: {e}")
+                return
+
+            if count:
                 st.success(f"✅ {count} 件の作業記録をインポートしました！")
                 st.balloons()
             else:
                 st.warning("インポートするレコードがありませんでした")
 
 
-def _convert_date(raw_date, prev_date):
-    """日付文字列を YYYY-MM-DD 形式に変換"""
-    if not raw_date or raw_date == "nan":
-        return prev_date  # 空欄は前行の日付を引き継ぐ
+def _iter_import_rows(chunks, col_map):
+    """チャンクごとに整形した作業記録のタプルを順に返す（日付は前チャンクから引き継ぐ）"""
+    prev_date = ""
+    for chunk in chunks:
+        clean = _clean_import_frame(chunk, col_map, prev_date)
+        if not clean.empty:
+            prev_date = clean["work_date"].iat[-1]
+        yield from clean.itertuples(index=False, name=None)
 
-    raw_date = raw_date.strip()
 
-    # YY/MM/DD 形式
-    if "/" in raw_date:
-        parts = raw_date.split("/")
-        if len(parts) == 3:
-            try:
-                y, m, d = int(parts[0]), int(parts[1]), int(parts[2])
-                if y < 100:
-                    y += 2000
-                return f"{y:04d}-{m:02d}-{d:02d}"
-            except ValueError:
-                pass
+def _pick_encoding(raw, encodings):
+    """候補のうちファイル全体を復号できる最初の文字コードを返す（なければNone）"""
+    view = memoryview(raw)
+    for enc in encodings:
+        decoder = codecs.getincrementaldecoder(enc)()
+        try:
+            for start in range(0, len(view), CSV_CHUNK_BYTES):
+                decoder.decode(view[start:start + CSV_CHUNK_BYTES])
+            decoder.decode(b"", final=True)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def _detect_encoding(raw):
+    """BOMと先頭64KBの試し読みからCSVの文字コードを推定"""
+    if raw.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if raw[:2] in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+        return "utf-16"
+    sample = raw[:65536]
+    # 末尾で途切れたマルチバイト文字は許容するため、逐次デコーダーで判定する
+    for enc in ("utf-8", "cp932"):
+        try:
+            codecs.getincrementaldecoder(enc)().decode(sample)
+            return enc
+        except UnicodeDecodeError:
+            pass
+    if _detect_charset is not None:
+        best = _detect_charset(sample, cp_isolation=CSV_ENCODINGS).best()
+        if best is not None:
+            return best.encoding
+    return CSV_ENCODINGS[0]
+
 
-    # YYYY-MM-DD 形式（そのまま）
-    if "-" in raw_date and len(raw_date) == 10:
-        return raw_date
+def _normalize_dates(values, prev_date=""):
+    """日付列をまとめて YYYY-MM-DD 形式に変換（空欄・不明は前行の日付を引き継ぐ）"""
+    # 全角数字・記号も受け付けるよう NFKC で半角にそろえてから表記ごとに分解
+    parts = pd.Series(values, dtype=object).str.normalize("NFKC").str.extract(_CSV_DATE_RE)
+
+    # YYYY-MM-DD 形式（実在する日付のみ）
+    dates = pd.to_datetime(parts[3], format=_DATE_FORMAT, errors="coerce").dt.strftime(_DATE_FORMAT)
 
     # YYYYMMDD 形式 (8桁数値)
-    if len(raw_date) == 8 and raw_date.isdigit():
-        try:
-            return f"{raw_date[:4]}-{raw_date[4:6]}-{raw_date[6:8]}"
-        except (ValueError, IndexError):
-            pass
+    digits = parts[4]
+    dates = dates.fillna(digits.str[:4] + "-" + digits.str[4:6] + "-" + digits.str[6:])
+
+    # YY/MM/DD 形式
+    ymd = parts[[0, 1, 2]].dropna().astype(int)
+    if not ymd.empty:
+        ymd[0] = ymd[0].where(ymd[0] >= 100, ymd[0] + 2000)
+        dates[ymd.index] = (
+            ymd[0].astype(str).str.zfill(4) + "-"
+            + ymd[1].astype(str).str.zfill(2) + "-"
+            + ymd[2].astype(str).str.zfill(2)
+        )
 
-    return prev_date
+    return dates.ffill().fillna(prev_date).tolist()
 
 
-def _get_val(row, col_name):
-    """DataFrameの行から値を取得（なし/nan → None）"""
+def _column_strings(df, col_name):
+    """DataFrameの列を前後の空白を除いた文字列のリストで取得（なし → 空文字）"""
     if col_name == "（なし）":
-        return None
-    val = str(row.get(col_name, "")).strip()
-    if val == "nan" or val == "":
-        return None
-    return val
+        return [""] * len(df)
+    return df[col_name].str.strip().tolist()
+
+
+def _clean_import_frame(df, col_map, prev_date=""):
+    """CSVの列を作業記録の列に対応づけて整形（空行は除く）"""
+    text_cols = ["field_id", "row_id", "content", "note"]
+    clean = pd.DataFrame({
+        "work_date": _normalize_dates(_column_strings(df, col_map["work_date"]), prev_date),
+        "work_type": _column_strings(df, col_map["work_type"]),
+        **{col: _column_strings(df, col_map[col]) for col in text_cols},
+    }, dtype=object)
+
+    # 空欄は None、作業種別の空欄は「その他」
+    clean[text_cols] = clean[text_cols].mask(clean[text_cols] == "", None)
+    clean["work_type"] = clean["work_type"].mask(clean["work_type"] == "", "その他")
+    clean["cell_pot"] = None
+    clean["quantity"] = None
+
+    # 日付も内容もない行はスキップ
+    keep = (clean["work_date"] != "") | clean["content"].notna()
+    return clean.loc[keep, list(db.IMPORT_COLUMNS)]
 
 
 # ============================================================
@@ -1012,6 +1246,10 @@ def _get_val(row, col_name):
 def page_work_log_list():
     st.header("📋 作業記録一覧")
 
+    cycles_version = db.get_cycles_version()
+    logs_version = db.get_work_logs_version()
+    distinct = _distinct_sets(cycles_version, logs_version)
+
     # フィルター
     fc1, fc2, fc3, fc4 = st.columns(4)
     with fc1:
@@ -1020,59 +1258,87 @@ def page_work_log_list():
     with fc2:
         d_to = st.date_input("終了日", value=date.today(), key="wl_to")
     with fc3:
-        types = ["すべて"] + db.get_distinct_work_types()
+        types = ["すべて"] + distinct["work_type"]
         type_f = st.selectbox("作業種別", types, key="wl_type")
     with fc4:
-        fields = ["すべて"] + db.get_distinct_fields()
+        fields = ["すべて"] + distinct["field"]
         field_f = st.selectbox("圃場", fields, key="wl_field")
 
-    logs = db.get_all_work_logs(
-        date_from=d_from.strftime("%Y-%m-%d"),
-        date_to=d_to.strftime("%Y-%m-%d"),
-        work_type=type_f,
-        field_id=field_f,
+    df = _filtered_work_logs(
+        cycles_version, logs_version,
+        d_from.strftime("%Y-%m-%d"), d_to.strftime("%Y-%m-%d"),
+        type_f, field_f,
     )
 
-    if logs:
-        st.caption(f"{len(logs)} 件の作業記録")
-        df = pd.DataFrame(logs)
-        display_cols = ["id", "work_date", "work_type", "cell_pot", "quantity",
-                        "crop_name", "field_id", "content", "note"]
-        existing_cols = [c for c in display_cols if c in df.columns]
-        display_df = df[existing_cols].copy()
-        col_rename = {
-            "id": "ID", "work_date": "日付", "work_type": "作業",
-            "cell_pot": "セル・ポット", "quantity": "数量",
-            "crop_name": "作付け", "field_id": "圃場",
-            "content": "内容", "note": "備考",
-        }
-        display_df.rename(columns=col_rename, inplace=True)
+    if not df.empty:
+        st.caption(f"{len(df)} 件の作業記録")
+        df["work_date"] = to_date_series(df["work_date"])
+        existing_cols = [c for c in _LOG_COLUMNS if c in df.columns]
+        display_df = df[existing_cols].astype(
+            {c: "category" for c in _LOG_CATEGORY_COLUMNS if c in df.columns}
+        ).rename(columns=_LOG_COL_RENAME)
         st.dataframe(display_df, use_container_width=True, hide_index=True)
     else:
         st.info("該当する作業記録がありません")
 
 
+# ============================================================
+# ページ定義
+# ============================================================
+PAGE_DASHBOARD = st.Page(page_dashboard, title="ダッシュボード", icon="📊",
+                         url_path="dashboard", default=not SIMPLE_ONLY_MODE)
+PAGE_CROP_CYCLES = st.Page(page_crop_cycles, title="作付け一覧", icon="🌱",
+                           url_path="crop-cycles")
+PAGE_CROP_CYCLES_SIMPLE = st.Page(page_crop_cycles_simple, title="作付け一覧（簡易）",
+                                  icon="🌱", url_path="crop-cycles-simple",
+                                  default=SIMPLE_ONLY_MODE)
+PAGE_TIMELINE = st.Page(page_timeline, title="タイムライン", icon="📅",
+                        url_path="timeline")
+PAGE_WORK_LOG_LIST = st.Page(page_work_log_list, title="作業記録一覧", icon="📋",
+                             url_path="work-logs")
+PAGE_ANALYTICS = st.Page(page_analytics, title="集計・分析", icon="📈",
+                         url_path="analytics")
+PAGE_WORK_LOG_INPUT = st.Page(page_work_log_input, title="作業記録入力", icon="📝",
+                              url_path="work-log-input")
+PAGE_CROP_CYCLE_FORM = st.Page(page_crop_cycle_form, title="作付け登録・編集", icon="🌱",
+                               url_path="crop-cycle-form")
+PAGE_CSV_IMPORT = st.Page(page_csv_import, title="CSVインポート", icon="📥",
+                          url_path="csv-import")
+
+VIEW_PAGES = [
+    PAGE_DASHBOARD,
+    PAGE_CROP_CYCLES,
+    PAGE_CROP_CYCLES_SIMPLE,
+    PAGE_TIMELINE,
+    PAGE_WORK_LOG_LIST,
+    PAGE_ANALYTICS,
+]
+ADMIN_PAGES = [
+    PAGE_WORK_LOG_INPUT,
+    PAGE_CROP_CYCLE_FORM,
+    PAGE_CSV_IMPORT,
+]
+
 # ============================================================
 # サイドバー & ルーティング
 # ============================================================
-if not SIMPLE_ONLY_MODE:
+# 選択中のページだけを実行する（メニューは下のサイドバーで独自に描画）
+if SIMPLE_ONLY_MODE:
+    nav = st.navigation([PAGE_CROP_CYCLES_SIMPLE], position="hidden")
+else:
+    nav_pages = {"閲覧": VIEW_PAGES}
+    if st.session_state.admin_mode:
+        nav_pages["管理者メニュー"] = ADMIN_PAGES
+    nav = st.navigation(nav_pages, position="hidden")
+
     with st.sidebar:
         st.markdown("## 🌾 農作業記録簿")
         st.divider()
 
         # 閲覧メニュー
         st.markdown("### 📖 閲覧")
-        view_pages = [
-            "📊 ダッシュボード",
-            "🌱 作付け一覧",
-            "🌱 作付け一覧（簡易）",
-            "📅 タイムライン",
-            "📋 作業記録一覧",
-            "📈 集計・分析",
-        ]
-        for p in view_pages:
-            if st.button(p, key=f"nav_{p}", use_container_width=True):
-                st.session_state.page = p
+        for p in VIEW_PAGES:
+            st.page_link(p, use_container_width=True)
 
         st.divider()
 
@@ -1088,20 +1354,13 @@ if not SIMPLE_ONLY_MODE:
                     st.error("パスワードが違います")
         else:
             st.markdown("### 🔓 管理者メニュー")
-            admin_pages = [
-                "📝 作業記録入力",
-                "🌱 作付け登録・編集",
-                "📥 CSVインポート",
-            ]
-            for p in admin_pages:
-                if st.button(p, key=f"nav_{p}", use_container_width=True):
-                    st.session_state.page = p
+            for p in ADMIN_PAGES:
+                st.page_link(p, use_container_width=True)
 
             st.divider()
             if st.button("🚪 ログアウト", key="logout_btn"):
                 st.session_state.admin_mode = False
-                st.session_state.page = "📊 ダッシュボード"
-                st.rerun()
+                st.switch_page(PAGE_DASHBOARD)
 
         # フッター
         st.divider()
@@ -1109,30 +1368,4 @@ if not SIMPLE_ONLY_MODE:
         if st.session_state.admin_mode:
             st.caption("ローカル初期PW: farm2026")
 
-# ============================================================
-# ページルーティング
-# ============================================================
-page = st.session_state.page
-
-if SIMPLE_ONLY_MODE:
-    page_crop_cycles_simple()
-elif page == "📊 ダッシュボード":
-    page_dashboard()
-elif page == "🌱 作付け一覧":
-    page_crop_cycles()
-elif page == "🌱 作付け一覧（簡易）":
-    page_crop_cycles_simple()
-elif page == "📅 タイムライン":
-    page_timeline()
-elif page == "📋 作業記録一覧":
-    page_work_log_list()
-elif page == "📈 集計・分析":
-    page_analytics()
-elif page == "📝 作業記録入力":
-    page_work_log_input()
-elif page == "🌱 作付け登録・編集":
-    page_crop_cycle_form()
-elif page == "📥 CSVインポート":
-    page_csv_import()
-else:
-    page_dashboard()
+nav.run()
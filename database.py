@@ -3,8 +3,16 @@
 ローカルはSQLite、クラウドはPostgreSQLで運用できるようにする。
 """
 
+import atexit
 import sqlite3
 import os
+import threading
+import weakref
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
 
 try:
     import psycopg
@@ -14,8 +22,131 @@ except Exception:  # PostgreSQL未使用時のローカル実行を許容
     dict_row = None
 
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "farm_records.db")
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # 読み取りをメモリマップで行う上限（バイト）
+SQLITE_CACHE_SIZE_KIB = 64000  # 接続ごとのページキャッシュ上限（KiB）
+SQLITE_AUTO_VACUUM_INCREMENTAL = 2  # PRAGMA auto_vacuum の INCREMENTAL
+FETCH_BATCH_SIZE = 1000  # 全件を一度に取り出さない読み出しの1回あたりの行数
 STATUS_OPTIONS = ("育苗中", "まもなく収穫開始", "収穫中", "まもなく収穫終了", "終了", "計画中")
 
+# スキーマの版（テーブル・インデックス構成を変えたら上げる）
+SCHEMA_VERSION = 6
+
+# CSVインポートで受け付ける列（import_work_log_rows のタプルはこの順）
+IMPORT_COLUMNS = ("work_date", "work_type", "cell_pot", "quantity",
+                  "field_id", "row_id", "content", "note")
+
+# テーブルごとの更新世代（画面側キャッシュのキーに使う）
+_versions = {"crop_cycles": 0, "work_logs": 0}
+
+# 集計・絞り込みに使う列のインデックス（SQLite/PostgreSQL共通の構文）
+_INDEX_SQL = (
+    # 一覧の ORDER BY work_date DESC, id DESC をインデックスの逆順走査で返す
+    "CREATE INDEX IF NOT EXISTS idx_work_logs_date_id ON work_logs(work_date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_work_logs_type ON work_logs(work_type)",
+    # 作付けごとの作業記録を日付順のまま取り出す
+    "CREATE INDEX IF NOT EXISTS idx_work_logs_cycle_date"
+    " ON work_logs(cycle_id, work_date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_work_logs_field ON work_logs(field_id)",
+    "CREATE INDEX IF NOT EXISTS idx_crop_cycles_field ON crop_cycles(field_id)",
+    "CREATE INDEX IF NOT EXISTS idx_crop_cycles_crop ON crop_cycles(crop_name)",
+    "CREATE INDEX IF NOT EXISTS idx_crop_cycles_status ON crop_cycles(status)",
+    # 作付け一覧の並び順（未定の開始日は先頭）と同じ式のインデックス
+    "CREATE INDEX IF NOT EXISTS idx_crop_cycles_start"
+    " ON crop_cycles(COALESCE(start_date, '9999'), id)",
+    # 月別集計の GROUP BY 用（work_date も含めてインデックスだけで集計できるようにする。
+    # 日付が空の行は集計しないので部分インデックスから外す）
+    "CREATE INDEX IF NOT EXISTS idx_work_logs_month_dated"
+    " ON work_logs(substr(work_date, 1, 7), work_date) WHERE work_date != ''",
+)
+
+# 上のインデックスに置き換わって不要になったインデックス（移行時に削除する）
+_RETIRED_INDEXES = ("idx_work_logs_date", "idx_work_logs_cycle", "idx_work_logs_month",
+                    "idx_work_logs_unlinked")
+
+# 画面で使う列（作成・更新日時は読み出さない）
+_CYCLE_FIELDS = ("id, crop_name, variety, field_id, row_id, start_date, end_date,"
+                 " status, yield_amount, yield_unit, quality_rating, quality_note,"
+                 " comment")
+_LOG_FIELDS = ("id, cycle_id, work_date, work_type, cell_pot, quantity,"
+               " field_id, row_id, content, note")
+# 作付けと結合する作業記録の列
+_LOG_FIELDS_JOINED = (", ".join(f"wl.{col.strip()}" for col in _LOG_FIELDS.split(","))
+                      + ", cc.crop_name, cc.variety")
+
+# update_* で更新できる列（UPDATE文の列名はここにあるものだけ埋め込む）
+_UPDATE_COLUMNS = {
+    "crop_cycles": frozenset((
+        "crop_name", "variety", "field_id", "row_id", "start_date", "end_date",
+        "status", "yield_amount", "yield_unit", "quality_rating", "quality_note",
+        "comment",
+    )),
+    "work_logs": frozenset((
+        "cycle_id", "work_date", "work_type", "cell_pot", "quantity",
+        "field_id", "row_id", "content", "note",
+    )),
+}
+
+# 繰り返し実行する1件単位のSQL（文字列を固定し、SQLite/psycopgの文キャッシュに載せる）
+_SQL_INS_CYCLE = """
+    INSERT INTO crop_cycles
+        (crop_name, variety, field_id, row_id,
+         start_date, end_date, status,
+         yield_amount, yield_unit,
+         quality_rating, quality_note, comment)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_SQL_GET_CYCLE = f"SELECT {_CYCLE_FIELDS} FROM crop_cycles WHERE id = ?"
+_SQL_DEL_CYCLE = "DELETE FROM crop_cycles WHERE id = ?"
+# 一覧の SELECT 部（絞り込みと並び順は _filtered_select で付ける）
+_SQL_CYCLE_LIST = f"SELECT {_CYCLE_FIELDS} FROM crop_cycles"
+_SQL_LOG_LIST = f"""
+    SELECT {_LOG_FIELDS_JOINED}
+    FROM work_logs wl
+    LEFT JOIN crop_cycles cc ON wl.cycle_id = cc.id
+"""
+_SQL_LOG_COUNT = "SELECT COUNT(*) FROM work_logs wl"
+_LOG_LIST_ORDER = "ORDER BY wl.work_date DESC, wl.id DESC"
+_SQL_INS_LOG = """
+    INSERT INTO work_logs (cycle_id, work_date, work_type, cell_pot, quantity,
+                           field_id, row_id, content, note)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# CSVインポート用（列は IMPORT_COLUMNS の順）
+_SQL_INS_LOG_CSV = """
+    INSERT INTO work_logs
+        (work_date, work_type, cell_pot, quantity,
+         field_id, row_id, content, note)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# INSERT ... RETURNING id（SQLiteは 3.35 以降で対応）
+_SQLITE_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+_RETURNING_ID_SQL = {
+    sql: sql + "RETURNING id" for sql in (_SQL_INS_CYCLE, _SQL_INS_LOG)
+}
+_SQL_LOGS_BY_CYCLE = f"""
+    SELECT {_LOG_FIELDS} FROM work_logs WHERE cycle_id = ?
+    ORDER BY work_date ASC, id ASC
+"""
+_SQL_DEL_LOG = "DELETE FROM work_logs WHERE id = ?"
+_SQL_LINK_LOG = "UPDATE work_logs SET cycle_id = ? WHERE id = ?"
+_SQL_UNLINK_LOG = "UPDATE work_logs SET cycle_id = NULL WHERE id = ?"
+
+# 両テーブルの圃場IDをそれぞれインデックス上で DISTINCT してから連結する
+# （生の行を UNION / GROUP BY するより、重複除去の対象が圃場の数で済む）
+_SQL_DISTINCT_FIELDS = """
+    SELECT DISTINCT field_id FROM crop_cycles
+    WHERE field_id IS NOT NULL AND field_id != ''
+    UNION ALL
+    SELECT DISTINCT field_id FROM work_logs
+    WHERE field_id IS NOT NULL AND field_id != ''
+"""
+
+# スレッドごとに使い回す接続（Streamlitは再実行ごとに別スレッドで動く）
+_local = threading.local()
+# 終了したスレッドから返された接続 [(接続先, 接続)]。次のスレッドが再利用する
+_idle_conns = []
+_idle_lock = threading.Lock()
+
 
 def _database_url():
     return os.getenv("DATABASE_URL", "").strip()
@@ -27,7 +158,13 @@ def using_postgres():
 
 def _param_sql(sql):
     """SQLiteの?プレースホルダをPostgreSQL用%sへ変換"""
-    if using_postgres():
+    return _convert_placeholders(sql, using_postgres())
+
+
+@lru_cache(maxsize=256)
+def _convert_placeholders(sql, postgres):
+    """変換結果を文ごとに使い回す（接続先は import 後に決まるので実行時にキャッシュする）"""
+    if postgres:
         return sql.replace("?", "%s")
     return sql
 
@@ -36,6 +173,21 @@ def _now_sql():
     return "CURRENT_TIMESTAMP" if using_postgres() else "datetime('now', 'localtime')"
 
 
+def get_cycles_version():
+    """作付けデータの更新世代を取得（作付けの書き込みごとに増える）"""
+    return _versions["crop_cycles"]
+
+
+def get_work_logs_version():
+    """作業記録データの更新世代を取得（作業記録の書き込みごとに増える）"""
+    return _versions["work_logs"]
+
+
+def _bump_version(*tables):
+    for table in tables:
+        _versions[table] += 1
+
+
 def _row_first_value(row):
     """fetchone() の結果から先頭値をDB差異なく取得"""
     if row is None:
@@ -45,26 +197,209 @@ def _row_first_value(row):
     return row[0]
 
 
-def get_connection():
-    """データベース接続を取得"""
+def _open_connection(readonly=False):
+    """新しいデータベース接続を開く（readonly はSQLiteのみ読み取り専用で開く）"""
     if using_postgres():
         if psycopg is None:
             raise RuntimeError(
                 "PostgreSQL接続に必要なpsycopgがインストールされていません。"
             )
-        conn = psycopg.connect(_database_url(), row_factory=dict_row)
-        return conn
-
-    conn = sqlite3.connect(DB_PATH)
+        # 読み取りでトランザクションを開いたままにしないよう autocommit で使う。
+        # 長く使い回すのでサーバー側プリペアドステートメントは作らない
+        # （トランザクション単位のプーラー経由だと名前が衝突するため）
+        return psycopg.connect(_database_url(), row_factory=dict_row,
+                               autocommit=True, prepare_threshold=None)
+
+    # 接続はスレッド間で引き継ぐが、同時に使うのは常に1スレッドだけ
+    if readonly:
+        conn = sqlite3.connect(Path(DB_PATH).as_uri() + "?mode=ro", uri=True,
+                               check_same_thread=False)
+    else:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
+    if not readonly:  # ジャーナル設定・外部キー検査は書き込み用の接続だけで要る
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KIB}")
     return conn
 
 
+class _ConnectionLease:
+    """スレッドが使用中の接続（スレッド終了で破棄されると接続を返却する）"""
+
+    def __init__(self, key, conn):
+        self.key = key
+        self.conn = conn
+        weakref.finalize(self, _release_connection, key, conn)
+
+
+def _connection_alive(conn):
+    """接続が閉じても壊れてもいないか（PostgreSQLは切断を検知済みかだけを見る）"""
+    return not (getattr(conn, "closed", False) or getattr(conn, "broken", False))
+
+
+def _connection_reusable(conn):
+    """再利用待ちの接続がまだ使えるか（PostgreSQLはサーバーへ1往復して確かめる）"""
+    if not _connection_alive(conn):
+        return False
+    if isinstance(conn, sqlite3.Connection):
+        return True
+    if conn.info.transaction_status != psycopg.pq.TransactionStatus.IDLE:
+        return False
+    try:
+        conn.execute("SELECT 1")  # サーバーやプロキシが切った接続をここで見つける
+    except psycopg.Error:
+        return False
+    return True
+
+
+def _release_connection(key, conn):
+    """使い終わった接続を再利用待ちに戻す"""
+    if _connection_alive(conn):
+        with _idle_lock:
+            _idle_conns.append((key, conn))
+
+
+def _take_idle_connection(key):
+    """再利用待ちの接続から接続先の一致する、まだ使えるものを取り出す"""
+    while True:
+        with _idle_lock:
+            for i, (idle_key, conn) in enumerate(_idle_conns):
+                if idle_key == key:
+                    del _idle_conns[i]
+                    break
+            else:
+                return None
+        if _connection_reusable(conn):
+            return conn
+        try:  # 使えない接続は閉じて次を探す
+            conn.close()
+        except Exception:
+            pass
+
+
+def get_connection(readonly=False):
+    """データベース接続を取得（同じスレッドでは使い回し、スレッド終了後は次へ引き継ぐ）
+
+    readonly=True はSQLiteでは書き込み用とは別の読み取り専用接続を返す。
+    PostgreSQLでは区別せず同じ接続を使う。
+    """
+    url = _database_url()
+    readonly = readonly and not url
+    key = (url or DB_PATH, readonly)
+    attr = "ro_lease" if readonly else "lease"
+    lease = getattr(_local, attr, None)
+    if (lease is not None and lease.key == key
+            and _connection_alive(lease.conn)):
+        return lease.conn
+    conn = _take_idle_connection(key) or _open_connection(readonly)
+    setattr(_local, attr, _ConnectionLease(key, conn))
+    return conn
+
+
+@atexit.register
+def close_connections():
+    """プロセス終了時に再利用待ちと現在のスレッドの接続を閉じる"""
+    _local.lease = _local.ro_lease = None  # 現在のスレッドの接続も再利用待ちへ返す
+    with _idle_lock:
+        conns = [conn for _, conn in _idle_conns]
+        _idle_conns.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _fetch_all(cursor):
+    """実行済みカーソルの全行をdictのリストで取得（PostgreSQLは既にdictなので複製しない）"""
+    rows = cursor.fetchall()
+    if rows and isinstance(rows[0], dict):  # PostgreSQL（dict_row）
+        return rows
+    return [dict(row) for row in rows]
+
+
+def _iter_batches(cursor, size=FETCH_BATCH_SIZE):
+    """実行済みカーソルの結果を size 行ずつ取り出す"""
+    while True:
+        batch = cursor.fetchmany(size)
+        if not batch:
+            return
+        yield batch
+
+
+def _fetch_df(cursor):
+    """実行済みカーソルの結果を列単位でDataFrameに変換（行は一定件数ずつ列へ移す）"""
+    cols = [d[0] for d in cursor.description]
+    data = {c: [] for c in cols}
+    for batch in _iter_batches(cursor):
+        if isinstance(batch[0], dict):  # PostgreSQL（dict_row）
+            for c in cols:
+                data[c].extend(row[c] for row in batch)
+        else:
+            for c, values in zip(cols, zip(*batch)):
+                data[c].extend(values)
+    if cols and not data[cols[0]]:
+        data = {}  # 0件のときは空リストから float 列を作らない
+    return pd.DataFrame(data, columns=cols)
+
+
+@contextmanager
+def _transaction(conn, single_statement=False):
+    """書き込みを1トランザクションにまとめる（失敗時はロールバック）
+
+    single_statement=True の1文だけの書き込みは、PostgreSQLでは autocommit の
+    1文がそのまま原子的なので BEGIN/COMMIT の往復を足さない。
+    """
+    if using_postgres():
+        if single_statement:
+            yield
+            return
+        with conn.transaction():
+            yield
+    else:
+        with conn:
+            yield
+
+
+def _get_schema_version(cursor):
+    """適用済みのスキーマ版を取得（SQLiteは user_version、PostgreSQLは管理表）"""
+    if using_postgres():
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"
+        )
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        return _row_first_value(cursor.fetchone()) or 0
+    cursor.execute("PRAGMA user_version")
+    return _row_first_value(cursor.fetchone())
+
+
+def _set_schema_version(cursor, version):
+    """適用済みのスキーマ版を記録"""
+    if using_postgres():
+        cursor.execute("DELETE FROM schema_version")
+        cursor.execute(
+            _param_sql("INSERT INTO schema_version (version) VALUES (?)"), (version,)
+        )
+    else:
+        cursor.execute(f"PRAGMA user_version = {int(version)}")
+
+
 def init_db():
-    """データベースの初期化（テーブル作成）"""
+    """データベースの初期化（テーブル作成・移行はスキーマ版が古いときだけ行う）"""
+    _init_db_once(_database_url() or DB_PATH)
+
+
+@lru_cache(maxsize=None)
+def _init_db_once(target):
+    """接続先（target）ごとにプロセス内で1回だけスキーマを確認・移行"""
     conn = get_connection()
     cursor = conn.cursor()
+    if _get_schema_version(cursor) >= SCHEMA_VERSION:
+        return
 
     if using_postgres():
         cursor.execute(f"""
@@ -199,8 +534,78 @@ def init_db():
         except Exception:
             pass  # カラムが既に存在する場合などはスキップ
 
+    for index_sql in _INDEX_SQL:
+        cursor.execute(index_sql)
+    for index_name in _RETIRED_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+    _set_schema_version(cursor, SCHEMA_VERSION)
+    conn.commit()
+
+    # 追加したインデックスをプランナーが選べるよう統計情報を更新
+    cursor.execute("ANALYZE")
     conn.commit()
-    conn.close()
+
+    if not using_postgres():
+        # 削除で空いたページを同期前に incremental_vacuum で切り詰められるようにする
+        # （既存DBは VACUUM で作り直したときに反映される。トランザクション外で実行）
+        cursor.execute("PRAGMA auto_vacuum")
+        if _row_first_value(cursor.fetchone()) != SQLITE_AUTO_VACUUM_INCREMENTAL:
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            try:
+                cursor.execute("VACUUM")
+            except sqlite3.OperationalError:
+                pass  # 他の接続が使用中なら、次に VACUUM されるまで反映を見送る
+
+
+# ============================================================
+# 絞り込み・更新共通
+# ============================================================
+
+@lru_cache(maxsize=64)
+def _filtered_select_sql(select, conditions, order_by, postgres):
+    """有効な絞り込み条件の組ごとのSELECT文を組み立てる（postgres はキャッシュの区別用）"""
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return _param_sql(f"{select}{where} {order_by}")
+
+
+def _filtered_select(select, filters, order_by):
+    """(条件, 値) の並びから値が None でない条件だけでSQLとパラメータを作る
+    （? を含まない条件は値を有効・無効の切り替えにだけ使う）"""
+    active = [(cond, value) for cond, value in filters if value is not None]
+    sql = _filtered_select_sql(select, tuple(cond for cond, _ in active), order_by,
+                               using_postgres())
+    return sql, [value for cond, value in active if "?" in cond]
+
+
+@lru_cache(maxsize=64)
+def _update_sql(table, columns, postgres):
+    """列の組ごとのUPDATE文を組み立てる（postgres は接続先ごとに別キャッシュにするため）"""
+    set_clause = ", ".join(f"{col} = ?" for col in columns)
+    if table == "crop_cycles":
+        set_clause += f", updated_at = {_now_sql()}"
+    return _param_sql(f"UPDATE {table} SET {set_clause} WHERE id = ?")
+
+
+def _update_row(table, row_id, values):
+    """1行の指定列を更新（列名は許可リストで検査し、並びを揃えて同じSQL文を再利用する）"""
+    unknown = values.keys() - _UPDATE_COLUMNS[table]
+    if unknown:
+        raise ValueError(f"{table} で更新できない列です: {', '.join(sorted(unknown))}")
+    columns = tuple(sorted(values))
+    conn = get_connection()
+    with _transaction(conn, single_statement=True):
+        conn.execute(_update_sql(table, columns, using_postgres()),
+                     [values[col] for col in columns] + [row_id])
+
+
+def _insert_returning_id(cursor, sql, values):
+    """INSERTを実行し、新しい行のIDを同じ文の RETURNING で受け取る"""
+    if using_postgres() or _SQLITE_HAS_RETURNING:
+        cursor.execute(_param_sql(_RETURNING_ID_SQL[sql]), values)
+        return _row_first_value(cursor.fetchone())
+    cursor.execute(sql, values)  # RETURNING のない古いSQLite
+    return cursor.lastrowid
 
 
 # ============================================================
@@ -214,97 +619,55 @@ def create_crop_cycle(crop_name, variety=None, field_id=None, row_id=None,
     """作付けを新規作成"""
     conn = get_connection()
     cursor = conn.cursor()
-    if using_postgres():
-        cursor.execute(_param_sql("""
-            INSERT INTO crop_cycles
-                (crop_name, variety, field_id, row_id,
-                 start_date, end_date, status,
-                 yield_amount, yield_unit,
-                 quality_rating, quality_note, comment)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            RETURNING id
-        """), (crop_name, variety, field_id, row_id,
-               start_date, end_date, status,
-               yield_amount, yield_unit,
-               quality_rating, quality_note, comment))
-        cycle_id = cursor.fetchone()["id"]
-    else:
-        cursor.execute("""
-            INSERT INTO crop_cycles
-                (crop_name, variety, field_id, row_id,
-                 start_date, end_date, status,
-                 yield_amount, yield_unit,
-                 quality_rating, quality_note, comment)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (crop_name, variety, field_id, row_id,
+    values = (crop_name, variety, field_id, row_id,
               start_date, end_date, status,
               yield_amount, yield_unit,
-              quality_rating, quality_note, comment))
-        cycle_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+              quality_rating, quality_note, comment)
+    with _transaction(conn, single_statement=True):
+        cycle_id = _insert_returning_id(cursor, _SQL_INS_CYCLE, values)
+    _bump_version("crop_cycles")
     return cycle_id
 
 
 def get_all_crop_cycles(status_filter=None, crop_filter=None, field_filter=None):
     """作付け一覧を取得（フィルタ付き）"""
-    conn = get_connection()
-    query = "SELECT * FROM crop_cycles WHERE 1=1"
-    params = []
-
-    if status_filter and status_filter != "すべて":
-        query += " AND status = ?"
-        params.append(status_filter)
-    if crop_filter:
-        query += " AND crop_name LIKE ?"
-        params.append(f"%{crop_filter}%")
-    if field_filter and field_filter != "すべて":
-        query += " AND field_id = ?"
-        params.append(field_filter)
-
-    query += " ORDER BY COALESCE(start_date, '9999') DESC, id DESC"
-
+    conn = get_connection(readonly=True)
     cursor = conn.cursor()
-    cursor.execute(_param_sql(query), params)
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    cursor.execute(*_filtered_select(_SQL_CYCLE_LIST, (
+        ("status = ?",
+         status_filter if status_filter and status_filter != "すべて" else None),
+        ("crop_name LIKE ?", f"%{crop_filter}%" if crop_filter else None),
+        ("field_id = ?",
+         field_filter if field_filter and field_filter != "すべて" else None),
+    ), "ORDER BY COALESCE(start_date, '9999') DESC, id DESC"))
+    return _fetch_all(cursor)
 
 
 def get_crop_cycle(cycle_id):
     """作付けを1件取得"""
-    conn = get_connection()
+    conn = get_connection(readonly=True)
     cursor = conn.cursor()
-    cursor.execute(_param_sql("SELECT * FROM crop_cycles WHERE id = ?"), (cycle_id,))
+    cursor.execute(_param_sql(_SQL_GET_CYCLE), (cycle_id,))
     row = cursor.fetchone()
-    conn.close()
-    return dict(row) if row else None
+    if row is None or isinstance(row, dict):
+        return row
+    return dict(row)
 
 
 def update_crop_cycle(cycle_id, **kwargs):
     """作付けを更新"""
     if not kwargs:
         return
-    conn = get_connection()
-    set_clause = ", ".join(f"{key} = ?" for key in kwargs.keys())
-    values = list(kwargs.values()) + [cycle_id]
-    conn.execute(
-        _param_sql(
-            f"UPDATE crop_cycles SET {set_clause}, "
-            f"updated_at = {_now_sql()} WHERE id = ?"
-        ),
-        values
-    )
-    conn.commit()
-    conn.close()
+    _update_row("crop_cycles", cycle_id, kwargs)
+    _bump_version("crop_cycles")
 
 
 def delete_crop_cycle(cycle_id):
     """作付けを削除"""
     conn = get_connection()
-    conn.execute(_param_sql("DELETE FROM crop_cycles WHERE id = ?"), (cycle_id,))
-    conn.commit()
-    conn.close()
+    with _transaction(conn, single_statement=True):
+        conn.execute(_param_sql(_SQL_DEL_CYCLE), (cycle_id,))
+    _bump_version("crop_cycles", "work_logs")  # 紐づく作業記録の cycle_id も変わる
 
 
 # ============================================================
@@ -317,127 +680,173 @@ def create_work_log(work_date, work_type, cycle_id=None, cell_pot=None,
     """作業記録を新規作成"""
     conn = get_connection()
     cursor = conn.cursor()
-    if using_postgres():
-        cursor.execute(_param_sql("""
-            INSERT INTO work_logs (cycle_id, work_date, work_type, cell_pot, quantity,
-                                   field_id, row_id, content, note)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            RETURNING id
-        """), (cycle_id, work_date, work_type, cell_pot, quantity,
-               field_id, row_id, content, note))
-        log_id = cursor.fetchone()["id"]
-    else:
-        cursor.execute("""
-            INSERT INTO work_logs (cycle_id, work_date, work_type, cell_pot, quantity,
-                                   field_id, row_id, content, note)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (cycle_id, work_date, work_type, cell_pot, quantity,
-              field_id, row_id, content, note))
-        log_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    values = (cycle_id, work_date, work_type, cell_pot, quantity,
+              field_id, row_id, content, note)
+    with _transaction(conn, single_statement=True):
+        log_id = _insert_returning_id(cursor, _SQL_INS_LOG, values)
+    _bump_version("work_logs")
     return log_id
 
 
 def get_work_logs_by_cycle(cycle_id):
     """指定作付けの作業記録を時系列で取得"""
-    conn = get_connection()
+    conn = get_connection(readonly=True)
     cursor = conn.cursor()
-    cursor.execute(_param_sql("""
-        SELECT * FROM work_logs WHERE cycle_id = ?
-        ORDER BY work_date ASC, id ASC
-    """), (cycle_id,))
+    cursor.execute(_param_sql(_SQL_LOGS_BY_CYCLE), (cycle_id,))
+    return _fetch_all(cursor)
+
+
+def get_cycle_log_summaries(cycle_ids):
+    """指定作付けごとの作業件数・最新作業を1クエリで取得 {cycle_id: dict}"""
+    cycle_ids = list(cycle_ids)
+    if not cycle_ids:
+        return {}
+    placeholders = ", ".join("?" for _ in cycle_ids)
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    cursor.execute(_param_sql(f"""
+        SELECT w1.cycle_id,
+               COUNT(*) AS log_count,
+               (SELECT w2.work_type FROM work_logs w2
+                WHERE w2.cycle_id = w1.cycle_id
+                ORDER BY w2.work_date DESC, w2.id DESC
+                LIMIT 1) AS last_work_type,
+               MAX(w1.work_date) AS last_work_date
+        FROM work_logs w1
+        WHERE w1.cycle_id IN ({placeholders})
+        GROUP BY w1.cycle_id
+    """), cycle_ids)
+    return {row["cycle_id"]: row for row in _fetch_all(cursor)}
+
+
+def get_log_counts_by_cycle():
+    """作付けごとの作業記録件数を取得 {cycle_id: 件数}"""
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT cycle_id, COUNT(*) AS count FROM work_logs
+        WHERE cycle_id IS NOT NULL
+        GROUP BY cycle_id
+    """)
     rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    return {row["cycle_id"]: row["count"] for row in rows}
+
+
+def _work_log_filters(date_from=None, date_to=None, work_type=None,
+                      field_id=None, cycle_id=None, unlinked=False):
+    """作業記録一覧の絞り込み条件 (条件, 値) の並び"""
+    return (
+        ("wl.work_date >= ?", date_from or None),
+        ("wl.work_date <= ?", date_to or None),
+        ("wl.work_type = ?",
+         work_type if work_type and work_type != "すべて" else None),
+        ("wl.field_id = ?", field_id if field_id and field_id != "すべて" else None),
+        ("wl.cycle_id = ?", cycle_id),
+        ("wl.cycle_id IS NULL", True if unlinked else None),
+    )
 
 
-def get_all_work_logs(date_from=None, date_to=None, work_type=None,
-                      field_id=None, cycle_id=None):
-    """作業記録一覧を取得（フィルタ付き）"""
-    conn = get_connection()
-    query = """
-        SELECT wl.*, cc.crop_name, cc.variety
-        FROM work_logs wl
-        LEFT JOIN crop_cycles cc ON wl.cycle_id = cc.id
-        WHERE 1=1
-    """
-    params = []
-
-    if date_from:
-        query += " AND wl.work_date >= ?"
-        params.append(date_from)
-    if date_to:
-        query += " AND wl.work_date <= ?"
-        params.append(date_to)
-    if work_type and work_type != "すべて":
-        query += " AND wl.work_type = ?"
-        params.append(work_type)
-    if field_id and field_id != "すべて":
-        query += " AND wl.field_id = ?"
-        params.append(field_id)
-    if cycle_id is not None:
-        query += " AND wl.cycle_id = ?"
-        params.append(cycle_id)
-
-    query += " ORDER BY wl.work_date DESC, wl.id DESC"
+def _work_logs_query(date_from=None, date_to=None, work_type=None,
+                     field_id=None, cycle_id=None):
+    """作業記録一覧の検索SQLとパラメータを組み立てる"""
+    return _filtered_select(
+        _SQL_LOG_LIST,
+        _work_log_filters(date_from, date_to, work_type, field_id, cycle_id),
+        _LOG_LIST_ORDER,
+    )
+
 
+def count_work_logs(**filters):
+    """絞り込み後の作業記録の件数を取得（filters は get_work_logs_page と同じ）"""
+    conn = get_connection(readonly=True)
     cursor = conn.cursor()
-    cursor.execute(_param_sql(query), params)
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    cursor.execute(*_filtered_select(_SQL_LOG_COUNT, _work_log_filters(**filters), ""))
+    return _row_first_value(cursor.fetchone())
 
 
-def get_unlinked_work_logs():
-    """作付けに紐づいていない作業記録を取得"""
-    conn = get_connection()
+def get_work_logs_page(offset=0, limit=50, **filters):
+    """作業記録一覧の1ページ分を取得
+    （filters は date_from, date_to, work_type, field_id, cycle_id, unlinked）"""
+    conn = get_connection(readonly=True)
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT * FROM work_logs WHERE cycle_id IS NULL
-        ORDER BY work_date DESC, id DESC
-    """)
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    sql, params = _filtered_select(_SQL_LOG_LIST, _work_log_filters(**filters),
+                                   _LOG_LIST_ORDER + " LIMIT ? OFFSET ?")
+    cursor.execute(sql, params + [limit, offset])
+    return _fetch_all(cursor)
+
+
+def get_all_work_logs(date_from=None, date_to=None, work_type=None,
+                      field_id=None, cycle_id=None, as_dataframe=False):
+    """作業記録一覧を取得（フィルタ付き。as_dataframe なら行ごとのdictを作らずDataFrameで返す）"""
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    cursor.execute(*_work_logs_query(date_from, date_to, work_type, field_id, cycle_id))
+    return _fetch_df(cursor) if as_dataframe else _fetch_all(cursor)
 
 
 def update_work_log(log_id, **kwargs):
     """作業記録を更新"""
     if not kwargs:
         return
-    conn = get_connection()
-    set_clause = ", ".join(f"{key} = ?" for key in kwargs.keys())
-    values = list(kwargs.values()) + [log_id]
-    conn.execute(_param_sql(f"UPDATE work_logs SET {set_clause} WHERE id = ?"), values)
-    conn.commit()
-    conn.close()
+    _update_row("work_logs", log_id, kwargs)
+    _bump_version("work_logs")
 
 
 def delete_work_log(log_id):
     """作業記録を削除"""
     conn = get_connection()
-    conn.execute(_param_sql("DELETE FROM work_logs WHERE id = ?"), (log_id,))
-    conn.commit()
-    conn.close()
+    with _transaction(conn, single_statement=True):
+        conn.execute(_param_sql(_SQL_DEL_LOG), (log_id,))
+    _bump_version("work_logs")
 
 
 def link_work_log_to_cycle(log_id, cycle_id):
     """作業記録を作付けに紐づける"""
     conn = get_connection()
-    conn.execute(_param_sql("UPDATE work_logs SET cycle_id = ? WHERE id = ?"),
-                 (cycle_id, log_id))
-    conn.commit()
-    conn.close()
+    with _transaction(conn, single_statement=True):
+        conn.execute(_param_sql(_SQL_LINK_LOG), (cycle_id, log_id))
+    _bump_version("work_logs")
 
 
 def unlink_work_log_from_cycle(log_id):
     """作業記録の作付け紐づけを解除"""
     conn = get_connection()
-    conn.execute(_param_sql("UPDATE work_logs SET cycle_id = NULL WHERE id = ?"),
-                 (log_id,))
-    conn.commit()
-    conn.close()
+    with _transaction(conn, single_statement=True):
+        conn.execute(_param_sql(_SQL_UNLINK_LOG), (log_id,))
+    _bump_version("work_logs")
+
+
+def bulk_link_work_logs_to_cycle(log_ids, cycle_id):
+    """複数の作業記録を1文でまとめて作付けに紐づける"""
+    log_ids = list(log_ids)
+    if not log_ids:
+        return 0
+    placeholders = ", ".join("?" for _ in log_ids)
+    conn = get_connection()
+    cursor = conn.cursor()
+    with _transaction(conn, single_statement=True):
+        cursor.execute(
+            _param_sql(f"UPDATE work_logs SET cycle_id = ? WHERE id IN ({placeholders})"),
+            [cycle_id, *log_ids],
+        )
+    _bump_version("work_logs")
+    return cursor.rowcount
+
+
+def bulk_delete_work_logs(log_ids):
+    """複数の作業記録を1文でまとめて削除"""
+    log_ids = list(log_ids)
+    if not log_ids:
+        return 0
+    placeholders = ", ".join("?" for _ in log_ids)
+    conn = get_connection()
+    cursor = conn.cursor()
+    with _transaction(conn, single_statement=True):
+        cursor.execute(
+            _param_sql(f"DELETE FROM work_logs WHERE id IN ({placeholders})"), log_ids
+        )
+    _bump_version("work_logs")
+    return cursor.rowcount
 
 
 # ============================================================
@@ -446,54 +855,59 @@ def unlink_work_log_from_cycle(log_id):
 
 def get_dashboard_stats():
     """ダッシュボード用の統計情報を取得"""
-    conn = get_connection()
+    conn = get_connection(readonly=True)
     cursor = conn.cursor()
-    stats = {}
-
-    cursor.execute("SELECT COUNT(*) FROM crop_cycles")
-    stats["total_cycles"] = _row_first_value(cursor.fetchone())
-
+    # crop_cycles は条件付き集計で1回だけ走査する（空テーブルでも SUM が0になるよう COALESCE）
     cursor.execute("""
-        SELECT COUNT(*) FROM crop_cycles
-        WHERE status IN ('育苗中', 'まもなく収穫開始', '収穫中', 'まもなく収穫終了')
+        SELECT
+            COUNT(*) AS total_cycles,
+            COALESCE(SUM(CASE WHEN status IN
+                ('育苗中', 'まもなく収穫開始', '収穫中', 'まもなく収穫終了')
+                THEN 1 ELSE 0 END), 0) AS active_cycles,
+            COALESCE(SUM(CASE WHEN status = '終了' THEN 1 ELSE 0 END), 0)
+                AS completed_cycles,
+            (SELECT COUNT(*) FROM work_logs) AS total_logs,
+            COUNT(DISTINCT crop_name) AS crop_types
+        FROM crop_cycles
     """)
-    stats["active_cycles"] = _row_first_value(cursor.fetchone())
-
-    cursor.execute("SELECT COUNT(*) FROM crop_cycles WHERE status = '終了'")
-    stats["completed_cycles"] = _row_first_value(cursor.fetchone())
-
-    cursor.execute("SELECT COUNT(*) FROM work_logs")
-    stats["total_logs"] = _row_first_value(cursor.fetchone())
-
-    cursor.execute("SELECT COUNT(DISTINCT crop_name) FROM crop_cycles")
-    stats["crop_types"] = _row_first_value(cursor.fetchone())
-
-    conn.close()
-    return stats
+    return dict(cursor.fetchone())
 
 
 def get_recent_work_logs(limit=10):
     """最近の作業記録を取得"""
-    conn = get_connection()
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    cursor.execute(_param_sql(f"""
+        SELECT {_LOG_FIELDS_JOINED}
+        FROM work_logs wl
+        LEFT JOIN crop_cycles cc ON wl.cycle_id = cc.id
+        ORDER BY wl.work_date DESC, wl.id DESC
+        LIMIT ?
+    """), (limit,))
+    return _fetch_all(cursor)
+
+
+def get_recent_work_logs_slim(limit=20, as_dataframe=False):
+    """最近の作業記録を一覧表示に使う列だけ取得"""
+    conn = get_connection(readonly=True)
     cursor = conn.cursor()
     cursor.execute(_param_sql("""
-        SELECT wl.*, cc.crop_name, cc.variety
+        SELECT wl.id, wl.work_date, wl.work_type, wl.cell_pot, wl.quantity,
+               cc.crop_name, wl.field_id, wl.content, wl.note
         FROM work_logs wl
         LEFT JOIN crop_cycles cc ON wl.cycle_id = cc.id
         ORDER BY wl.work_date DESC, wl.id DESC
         LIMIT ?
     """), (limit,))
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    return _fetch_df(cursor) if as_dataframe else _fetch_all(cursor)
 
 
-def get_yield_summary():
+def get_yield_summary(as_dataframe=False):
     """収量集計を取得"""
-    conn = get_connection()
+    conn = get_connection(readonly=True)
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT crop_name, variety,
+        SELECT crop_name,
                SUM(yield_amount) as total_yield,
                yield_unit,
                AVG(yield_amount) as avg_yield,
@@ -503,31 +917,27 @@ def get_yield_summary():
         GROUP BY crop_name, yield_unit
         ORDER BY total_yield DESC
     """)
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    return _fetch_df(cursor) if as_dataframe else _fetch_all(cursor)
 
 
 def get_monthly_work_counts():
     """月別作業件数を取得"""
-    conn = get_connection()
+    conn = get_connection(readonly=True)
     cursor = conn.cursor()
     cursor.execute("""
         SELECT substr(work_date, 1, 7) as month,
                COUNT(*) as count
         FROM work_logs
-        WHERE work_date IS NOT NULL AND work_date != ''
-        GROUP BY month
+        WHERE work_date != ''
+        GROUP BY substr(work_date, 1, 7)
         ORDER BY month
     """)
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    return _fetch_all(cursor)
 
 
 def get_work_type_counts():
     """作業種別ごとの件数を取得"""
-    conn = get_connection()
+    conn = get_connection(readonly=True)
     cursor = conn.cursor()
     cursor.execute("""
         SELECT work_type, COUNT(*) as count
@@ -535,69 +945,86 @@ def get_work_type_counts():
         GROUP BY work_type
         ORDER BY count DESC
     """)
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    return _fetch_all(cursor)
 
 
 def get_distinct_fields():
     """登録済み圃場IDの一覧を取得"""
-    conn = get_connection()
+    conn = get_connection(readonly=True)
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT DISTINCT field_id FROM (
-            SELECT field_id FROM crop_cycles
-            WHERE field_id IS NOT NULL AND field_id != ''
-            UNION
-            SELECT field_id FROM work_logs
-            WHERE field_id IS NOT NULL AND field_id != ''
-        ) ORDER BY field_id
+    cursor.execute(f"""
+        SELECT field_id FROM ({_SQL_DISTINCT_FIELDS}) AS f
+        GROUP BY field_id
+        ORDER BY field_id
     """)
     rows = cursor.fetchall()
-    conn.close()
     return [row["field_id"] for row in rows]
 
 
 def get_distinct_crops():
     """登録済み作物名の一覧を取得"""
-    conn = get_connection()
+    conn = get_connection(readonly=True)
     cursor = conn.cursor()
     cursor.execute(
         "SELECT DISTINCT crop_name FROM crop_cycles ORDER BY crop_name"
     )
     rows = cursor.fetchall()
-    conn.close()
     return [row["crop_name"] for row in rows]
 
 
 def get_distinct_work_types():
     """登録済み作業種別の一覧を取得"""
-    conn = get_connection()
+    conn = get_connection(readonly=True)
     cursor = conn.cursor()
     cursor.execute(
         "SELECT DISTINCT work_type FROM work_logs ORDER BY work_type"
     )
     rows = cursor.fetchall()
-    conn.close()
     return [row["work_type"] for row in rows]
 
 
+def get_distinct_sets():
+    """圃場ID・作物名・作業種別の一覧を1回の問い合わせでまとめて取得"""
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    # kind 列で種類を見分ける（各種類の中では重複を除き済み）
+    cursor.execute(f"""
+        SELECT 'field' AS kind, field_id AS value
+        FROM ({_SQL_DISTINCT_FIELDS}) AS f
+        GROUP BY field_id
+        UNION ALL
+        SELECT 'crop', crop_name
+        FROM (SELECT DISTINCT crop_name FROM crop_cycles) AS c
+        UNION ALL
+        SELECT 'work_type', work_type
+        FROM (SELECT DISTINCT work_type FROM work_logs) AS t
+        ORDER BY kind, value
+    """)
+    sets = {"field": [], "crop": [], "work_type": []}
+    for row in cursor.fetchall():
+        sets[row["kind"]].append(row["value"])
+    return sets
+
+
 # ============================================================
 # CSVインポート
 # ============================================================
 
-def import_csv_records(records):
-    """CSVから読み込んだレコードを一括インポート"""
+def import_work_log_rows(rows):
+    """IMPORT_COLUMNS 順のタプルを作業記録として一括インポート（rows は逐次生成でもよい）"""
     conn = get_connection()
     cursor = conn.cursor()
-    imported = 0
-    for rec in records:
-        cursor.execute(_param_sql("""
-            INSERT INTO work_logs
-                (work_date, work_type, cell_pot, quantity,
-                 field_id, row_id, content, note)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """), (
+    # executemany は psycopg ではパイプライン化され、SQLiteでは1文の再利用になる
+    with _transaction(conn):
+        cursor.executemany(_param_sql(_SQL_INS_LOG_CSV), rows)
+    _bump_version("work_logs")
+    return cursor.rowcount
+
+
+def import_csv_records(records):
+    """CSVから読み込んだレコードを一括インポート"""
+    return import_work_log_rows(
+        (
             rec.get("work_date", ""),
             rec.get("work_type", "その他"),
             rec.get("cell_pot"),
@@ -606,8 +1033,6 @@ def import_csv_records(records):
             rec.get("row_id"),
             rec.get("content"),
             rec.get("note"),
-        ))
-        imported += 1
-    conn.commit()
-    conn.close()
-    return imported
+        )
+        for rec in records
+    )
@@ -6,7 +6,10 @@
   このファイルをダブルクリック、または以下のコマンドで実行:
     python sync_to_cloud.py
 """
+import shlex
+import shutil
 import subprocess
+import sqlite3
 import sys
 import os
 
@@ -28,6 +31,20 @@ if not os.path.exists("farm_records.db"):
 print("📦 変更をクラウドに同期します...")
 print()
 
+# 空きページを切り詰め、WAL に残っている変更をDB本体へ書き戻してからコミットする
+# （incremental_vacuum はアプリが auto_vacuum=INCREMENTAL にしたDBでのみ効く。
+#   execute では1ページしか解放されないため、最後まで実行する executescript を使う）
+conn = sqlite3.connect("farm_records.db")
+conn.executescript("PRAGMA incremental_vacuum;")
+busy, wal_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+conn.close()
+# WAL（.gitignore 対象）に変更が残ったままだと古いDBをプッシュしてしまう
+if busy or checkpointed < wal_pages:
+    print("❌ データベースが使用中のため、変更をDB本体へ書き戻せませんでした。")
+    print("   アプリを終了してから、もう一度同期してください。")
+    input("Enter キーで終了...")
+    sys.exit(1)
+
 try:
     # git add (すべての関連ファイルをまとめて追加)
     add_files = [
@@ -42,34 +59,25 @@ try:
         if os.path.exists(bat):
             add_files.append(bat)
 
-    result = subprocess.run(["git", "add"] + add_files,
-                            capture_output=True, text=True, encoding="utf-8", errors="replace")
-    if result.returncode != 0:
-        print(f"❌ git add に失敗: {result.stderr}")
-        input("Enter キーで終了...")
-        sys.exit(1)
-
-    # git commit
-    result = subprocess.run(
+    # add → commit → push を1回のシェル呼び出しでつなぐ（途中で失敗したら以降は実行しない）
+    steps = [
+        ["git", "add"] + add_files,
         ["git", "commit", "-m", "update: sync to cloud"],
-        capture_output=True, text=True, encoding="utf-8", errors="replace"
-    )
+        ["git", "push"],
+    ]
+    if shutil.which("git") is None:  # シェル経由では未インストールが例外にならない
+        raise FileNotFoundError("git")
+    join = subprocess.list2cmdline if os.name == "nt" else shlex.join
+    print("☁️  コミットしてGitHubにプッシュ中...")
+    result = subprocess.run(" && ".join(join(step) for step in steps), shell=True,
+                            capture_output=True, text=True, encoding="utf-8", errors="replace")
     if result.returncode != 0:
         out = (result.stdout or "") + (result.stderr or "")
         if "nothing to commit" in out or "nothing added to commit" in out:
             print("ℹ️  変更がありません。データは最新です。")
             input("Enter キーで終了...")
             sys.exit(0)
-        print(f"❌ git commit に失敗: {result.stderr}")
-        input("Enter キーで終了...")
-        sys.exit(1)
-
-    # git push
-    print("☁️  GitHubにプッシュ中...")
-    result = subprocess.run(["git", "push"],
-                            capture_output=True, text=True, encoding="utf-8", errors="replace")
-    if result.returncode != 0:
-        print(f"❌ git push に失敗: {result.stderr}")
+        print(f"❌ 同期に失敗: {out}")
         input("Enter キーで終了...")
         sys.exit(1)
 